@@ -0,0 +1,84 @@
+"""ONNX Runtime encoder for all-MiniLM-L6-v2.
+
+Drop-in replacement for SentenceTransformer.encode backed by an int8-quantized
+ONNX export of the model. ONNX Runtime fuses the attention/GELU kernels and
+the int8 weights cut memory bandwidth roughly 4x on CPU, which is where this
+API runs. The export is produced at image build time (see the Dockerfile):
+
+    optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 onnx_model/
+    python -c "from onnxruntime.quantization import quantize_dynamic, QuantType; \
+        quantize_dynamic('onnx_model/model.onnx', 'onnx_model/model_quant.onnx', \
+        weight_type=QuantType.QInt8)"
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+MAX_SEQ_LENGTH = 256
+
+
+class OnnxEncoder:
+    """Sentence encoder with the same encode() surface as SentenceTransformer"""
+
+    def __init__(self, model_dir: str, num_threads: Optional[int] = None):
+        model_path = os.path.join(model_dir, "model_quant.onnx")
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, "model.onnx")
+
+        # Non-OpenMP onnxruntime builds ignore OMP_NUM_THREADS and default the
+        # intra-op pool to all cores; session options are the only way to keep
+        # multiple worker processes from oversubscribing the machine
+        session_options = ort.SessionOptions()
+        if num_threads is not None:
+            session_options.intra_op_num_threads = num_threads
+            session_options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(
+            model_path, session_options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True):
+        """Encode one sentence or a list of sentences into embeddings"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        vectors = [
+            self._encode_batch(sentences[start : start + batch_size])
+            for start in range(0, len(sentences), batch_size)
+        ]
+        embeddings = np.concatenate(vectors, axis=0)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray(
+            [e.attention_mask for e in encodings], dtype=np.int64
+        )
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.asarray(
+                [e.type_ids for e in encodings], dtype=np.int64
+            )
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over non-padding tokens, then L2 normalization —
+        # the same pipeline SentenceTransformer applies for this model
+        mask = attention_mask[:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.clip(norms, 1e-9, None)).astype(np.float32)
@@ -98,6 +98,32 @@ class TestDocumentEndpoints:
         assert "id" in data
         assert data["status"] == "added"
 
+    def test_add_document_truncates_long_text(self, setup_qdrant):
+        """Test oversized documents are truncated before embedding"""
+        doc = {"text": "word " * 2000, "metadata": {"category": "test"}}
+        response = client.post("/documents", json=doc)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["text"]) <= 4096
+
+        # Cleanup
+        client.delete(f"/documents/{data['id']}")
+
+    def test_add_duplicate_document_is_idempotent(self, setup_qdrant):
+        """Test re-adding the same text maps to the same point ID"""
+        doc = {
+            "text": f"Deduplicated document {uuid.uuid4().hex[:8]}",
+            "metadata": {"category": "test"},
+        }
+        first = client.post("/documents", json=doc)
+        second = client.post("/documents", json=doc)
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.json()["id"] == second.json()["id"]
+
+        # Cleanup: one delete removes the single upserted point
+        client.delete(f"/documents/{first.json()['id']}")
+
     def test_get_all_documents(self, setup_qdrant):
         """Test retrieving all documents"""
         response = client.get("/documents")
@@ -108,6 +134,17 @@ class TestDocumentEndpoints:
         assert "total" in data
         assert "offset" in data
 
+    def test_get_all_documents_streamed_shape(self, setup_qdrant):
+        """Test the streamed listing is valid JSON with the full envelope"""
+        response = client.get("/documents?limit=3")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        data = response.json()
+        assert set(data.keys()) == {"documents", "total", "offset", "next_offset"}
+        assert data["total"] == len(data["documents"])
+        for document in data["documents"]:
+            assert set(document.keys()) == {"id", "text", "metadata"}
+
     def test_get_documents_with_pagination(self, setup_qdrant):
         """Test document retrieval with pagination"""
         response = client.get("/documents?limit=5&offset=0")
@@ -231,6 +268,27 @@ class TestCollectionEndpoints:
         # Cleanup: Delete the test collection
         client.delete(f"/collections/{test_collection_name}")
 
+    def test_create_collection_with_index_options(self, setup_qdrant):
+        """Test creating a collection with explicit quantization/HNSW options"""
+        test_collection_name = f"test_index_collection_{uuid.uuid4().hex[:8]}"
+        collection_data = {
+            "name": test_collection_name,
+            "vector_size": 384,
+            "distance": "Cosine",
+            "quantize": False,
+            "hnsw_m": 32,
+            "hnsw_ef_construct": 64,
+        }
+        response = client.post("/collections", json=collection_data)
+        assert response.status_code == 200
+        assert response.json()["status"] == "created"
+
+        info_response = client.get(f"/collections/{test_collection_name}/info")
+        assert info_response.status_code == 200
+
+        # Cleanup
+        client.delete(f"/collections/{test_collection_name}")
+
     def test_create_duplicate_collection(self, setup_qdrant):
         """Test creating a duplicate collection returns error"""
         test_collection_name = f"test_dup_collection_{uuid.uuid4().hex[:8]}"
@@ -252,6 +310,30 @@ class TestCollectionEndpoints:
         # Cleanup
         client.delete(f"/collections/{test_collection_name}")
 
+    def test_collection_cache_tracks_create_and_delete(self, setup_qdrant):
+        """Test the cached name set sees creates and deletes immediately"""
+        test_collection_name = f"test_cache_collection_{uuid.uuid4().hex[:8]}"
+        collection_data = {
+            "name": test_collection_name,
+            "vector_size": 384,
+            "distance": "Cosine",
+        }
+
+        # A duplicate create right after the first must hit the cached name
+        response = client.post("/collections", json=collection_data)
+        assert response.status_code == 200
+        response = client.post("/collections", json=collection_data)
+        assert response.status_code == 400
+
+        # Deleting must evict the name so an immediate re-create succeeds
+        response = client.delete(f"/collections/{test_collection_name}")
+        assert response.status_code == 200
+        response = client.post("/collections", json=collection_data)
+        assert response.status_code == 200
+
+        # Cleanup
+        client.delete(f"/collections/{test_collection_name}")
+
     def test_get_collection_info(self, setup_qdrant):
         """Test getting collection information"""
         response = client.get(f"/collections/{COLLECTION_NAME}/info")
@@ -303,6 +385,18 @@ class TestErrorHandling:
         response = client.post("/search", json={"invalid": "data"})
         assert response.status_code == 422  # Validation error
 
+    def test_add_document_with_empty_text(self):
+        """Test adding an empty or whitespace-only document is rejected"""
+        for text in ["", "   ", "\n\t "]:
+            response = client.post("/documents", json={"text": text})
+            assert response.status_code == 422
+
+    def test_search_with_empty_query(self):
+        """Test searching with an empty or whitespace-only query is rejected"""
+        for query in ["", "   ", "\n\t "]:
+            response = client.post("/search", json={"query": query})
+            assert response.status_code == 422
+
 
 class TestIntegration:
     """Integration tests for complete workflows"""